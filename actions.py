@@ -3,11 +3,12 @@ from __future__ import annotations
 from typing import Optional, Tuple, TYPE_CHECKING
 
 import color
+from entity import Item
 import exceptions
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Actor, Entity, Item
+    from entity import Actor, Entity
 
 class Action:
     def __init__(self, entity: Actor) -> None:
@@ -41,12 +42,14 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
         
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
+        for item in self.engine.game_map.get_entities_at_location(
+            actor_location_x, actor_location_y
+        ):
+            if isinstance(item, Item):
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible("Your inventory is full.")
                 
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
                 
@@ -160,7 +163,7 @@ class MovementAction(ActionWithDirection):
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             # Destination is out of bounds
             raise exceptions.Impossible("That way is blocked")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.walkable[dest_x, dest_y]:
             # Destination is blocked by a tile
             raise exceptions.Impossible("That way is blocked")
         if self.engine.game_map.get_blocking_entity_at_location(dest_x, dest_y):
@@ -0,0 +1,156 @@
+"""Generate dungeon floors offline, for balancing and regression testing
+
+Floors are built across a process pool exactly as the game would build them for the
+same world seed, without opening a window. Each floor is written to its own compressed
+.npz file and the time taken to generate each one to timings.csv, e.g.
+`python batch_generate.py --seeds 0-99 --floors 1-10 --out floors`
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+import statistics
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np # type: ignore
+
+from engine import Engine
+import entity_factories
+from game_map import GameWorld
+from procgen import generate_dungeon
+
+
+class FloorJob(NamedTuple):
+    seed: int
+    floor_number: int
+    map_width: int
+    map_height: int
+    max_rooms: int
+    room_min_size: int
+    room_max_size: int
+    out_dir: str
+
+
+class FloorResult(NamedTuple):
+    seed: int
+    floor_number: int
+    milliseconds: float
+    number_of_entities: int
+
+
+def generate_floor(job: FloorJob) -> FloorResult:
+    """Generate one floor, save it and return how long generating it took"""
+    player = entity_factories.player.copy()
+    engine = Engine(player=player, seed=job.seed)
+    game_world = GameWorld(
+        engine=engine,
+        map_width=job.map_width,
+        map_height=job.map_height,
+        max_rooms=job.max_rooms,
+        room_min_size=job.room_min_size,
+        room_max_size=job.room_max_size,
+        seed=job.seed,
+    )
+
+    start = time.perf_counter()
+    dungeon = generate_dungeon(
+        max_rooms=job.max_rooms,
+        room_min_size=job.room_min_size,
+        room_max_size=job.room_max_size,
+        map_width=job.map_width,
+        map_height=job.map_height,
+        engine=engine,
+        floor_number=job.floor_number,
+        rng=game_world.floor_rng(job.floor_number),
+    )
+    milliseconds = (time.perf_counter() - start) * 1000
+
+    entities = sorted(dungeon.entities, key=lambda entity: (entity.x, entity.y, entity.name))
+    np.savez_compressed(
+        os.path.join(job.out_dir, f"seed{job.seed}_floor{job.floor_number}.npz"),
+        tile_id=dungeon.tiles["tile_id"],
+        walkable=dungeon.walkable,
+        entity_names=np.array([entity.name for entity in entities]),
+        entity_positions=np.array(
+            [(entity.x, entity.y) for entity in entities], dtype=np.int16
+        ).reshape(-1, 2),
+        start_location=np.array(dungeon.start_location, dtype=np.int16),
+        downstairs_location=np.array(dungeon.downstairs_location, dtype=np.int16),
+    )
+
+    return FloorResult(job.seed, job.floor_number, milliseconds, len(entities))
+
+
+def parse_range(text: str) -> range:
+    """Parse "5" or an inclusive range such as "0-99" """
+    first, _, last = text.partition("-")
+    try:
+        return range(int(first), int(last or first) + 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or a range like 0-99, got {text!r}")
+
+
+def positive_int(text: str) -> int:
+    """Parse a whole number of at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a number of at least 1, got {text!r}")
+    return value
+
+
+def print_stats(results: List[FloorResult], wall_time: float) -> None:
+    times = sorted(result.milliseconds for result in results)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(
+        f"{len(results)} floors in {wall_time:.2f}s,"
+        f" ms per floor: mean {statistics.mean(times):.2f}"
+        f" median {statistics.median(times):.2f} p95 {p95:.2f} max {times[-1]:.2f}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=parse_range, default=range(0, 10), help="world seeds, e.g. 0-99")
+    parser.add_argument("--floors", type=parse_range, default=range(1, 6), help="floor numbers, e.g. 1-10")
+    parser.add_argument("--out", default="floors", help="directory to write floors and timings to")
+    parser.add_argument(
+        "--jobs", type=positive_int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=43)
+    parser.add_argument("--max-rooms", type=int, default=30)
+    parser.add_argument("--room-min-size", type=int, default=6)
+    parser.add_argument("--room-max-size", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs: List[FloorJob] = [
+        FloorJob(
+            seed, floor_number, args.width, args.height,
+            args.max_rooms, args.room_min_size, args.room_max_size, args.out
+        )
+        for seed in args.seeds for floor_number in args.floors
+    ]
+
+    start = time.perf_counter()
+    chunksize = max(1, len(jobs) // (4 * args.jobs))
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(generate_floor, jobs, chunksize=chunksize))
+    wall_time = time.perf_counter() - start
+
+    with open(os.path.join(args.out, "timings.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FloorResult._fields)
+        writer.writerows(results)
+
+    print_stats(results, wall_time)
+
+
+if __name__ == "__main__":
+    main()
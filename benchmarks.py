@@ -0,0 +1,218 @@
+"""Headless benchmarks for the game's hot paths
+
+Run `python benchmarks.py` to run all of them, or name the ones to run e.g.
+`python benchmarks.py pathing`
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from tcod.map import compute_fov
+
+from engine import Engine, FOV_RADIUS
+import entity_factories
+from game_map import GameMap, GameWorld
+from components.ai import CHASE_RADIUS
+from procgen import RectangularRoom, RoomPlacer
+import tile_types
+
+
+def build_open_floor(width: int, height: int, number_of_monsters: int, seed: int = 0) -> Engine:
+    """Return an engine on a walled, open floor with the player in the middle surrounded by orcs"""
+    rng = random.Random(seed)
+
+    player = entity_factories.player.copy()
+    engine = Engine(player=player, seed=seed)
+    engine.game_world = GameWorld(
+        engine=engine,
+        map_width=width,
+        map_height=height,
+        max_rooms=0,
+        room_min_size=0,
+        room_max_size=0,
+        seed=seed
+    )
+
+    game_map = GameMap(engine, width, height)
+    game_map.set_tiles((slice(1, -1), slice(1, -1)), tile_types.floor)
+    game_map.visible[:] = True
+    engine.game_map = game_map
+    player.place(width // 2, height // 2, game_map)
+
+    free = [
+        (x, y) for x in range(1, width - 1) for y in range(1, height - 1)
+        if (x, y) != (player.x, player.y)
+    ]
+    for x, y in rng.sample(free, number_of_monsters):
+        entity_factories.orc.spawn(game_map, x, y)
+
+    return engine
+
+
+def time_per_call(function: Callable[[], object], repeat: int = 5) -> float:
+    """Return the best time of `repeat` calls to function, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_pathing() -> None:
+    """Time one enemy turn of pathing, per monster pathfinders against the shared distance map
+
+    Only monsters that can see the player chase them, and the shared map covers the area
+    they can be in, so an enemy turn also shouldn't cost more on a bigger floor
+    """
+    print("pathing: ms per enemy turn for the monsters chasing the player, on a 120x120 floor")
+    print(f"{'monsters':>10} {'chasing':>8} {'per-monster':>12} {'shared':>10}")
+    for number_of_monsters in (10, 100, 500, 2000):
+        engine = build_open_floor(120, 120, number_of_monsters)
+        engine.update_fov()
+        game_map = engine.game_map
+        player = engine.player
+        chasers = [actor.ai for actor in engine.visible_actors if actor.ai]
+
+        def per_monster() -> None:
+            for ai in chasers:
+                ai.get_path_to(player.x, player.y)
+
+        def shared() -> None:
+            game_map.player_distance = None
+            for ai in chasers:
+                distance = game_map.get_player_distance(player.x, player.y, CHASE_RADIUS)
+                ai.get_path_down(distance, game_map.player_distance_origin)
+
+        repeat = 1 if len(chasers) > 100 else 3
+        print(
+            f"{number_of_monsters:>10} {len(chasers):>8}"
+            f" {time_per_call(per_monster, repeat):>12.1f} {time_per_call(shared, repeat):>10.1f}"
+        )
+
+    print("pathing: ms per enemy turn with no monsters, by floor size")
+    print(f"{'size':>10} {'enemy turn':>12}")
+    for size in (120, 500, 1000):
+        engine = build_open_floor(size, size, 0)
+        engine.update_fov()
+        print(f"{size:>10} {time_per_call(engine.handle_enemy_turns):>12.3f}")
+
+
+def bench_fov() -> None:
+    """Time a field of view update as the player walks, against computing it for the whole map"""
+    print("fov: ms per field of view update as the player moves")
+    print(f"{'map size':>10} {'whole map':>10} {'windowed':>10}")
+    for size in (100, 1000, 3000):
+        engine = build_open_floor(size, size, 0)
+        game_map = engine.game_map
+        player = engine.player
+        steps = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+        def whole_map() -> None:
+            for dx, dy in steps:
+                player.move(dx, dy)
+                game_map.visible[:] = compute_fov(
+                    game_map.transparent, (player.x, player.y), radius=FOV_RADIUS
+                )
+                game_map.explored |= game_map.visible
+
+        def windowed() -> None:
+            for dx, dy in steps:
+                player.move(dx, dy)
+                engine.update_fov()
+
+        print(
+            f"{size:>10} {time_per_call(whole_map, 3) / len(steps):>10.2f}"
+            f" {time_per_call(windowed, 3) / len(steps):>10.3f}"
+        )
+
+
+def bench_spawning() -> None:
+    """Time spawning monsters and items from their templates, by copy and by deepcopy"""
+    print("spawning: ms to spawn entities on a 200x200 floor")
+    print(f"{'entities':>10} {'deepcopy':>10} {'copy':>10}")
+    templates = [entity_factories.prototypes[name] for name in ("orc", "troll", "health_potion")]
+    for number_of_entities in (100, 1000, 5000):
+        engine = build_open_floor(200, 200, 0)
+        game_map = engine.game_map
+        positions = [(1 + i % 198, 1 + i // 198 % 198) for i in range(number_of_entities)]
+
+        def deepcopy() -> None:
+            for i, (x, y) in enumerate(positions):
+                clone = copy.deepcopy(templates[i % len(templates)])
+                clone.place(x, y, game_map)
+            for entity in list(game_map.entities - {engine.player}):
+                game_map.remove_entity(entity)
+
+        def spawn() -> None:
+            for i, (x, y) in enumerate(positions):
+                templates[i % len(templates)].spawn(game_map, x, y)
+            for entity in list(game_map.entities - {engine.player}):
+                game_map.remove_entity(entity)
+
+        print(
+            f"{number_of_entities:>10} {time_per_call(deepcopy, 3):>10.1f}"
+            f" {time_per_call(spawn, 3):>10.1f}"
+        )
+
+
+def bench_rooms() -> None:
+    """Time placing rooms on a 200x200 floor, against every placed room and against the bitmap"""
+    print("rooms: ms to place rooms on a 200x200 floor")
+    print(f"{'attempts':>10} {'placed':>8} {'intersects':>12} {'bitmap':>10}")
+    for attempts in (30, 300, 3000, 30000):
+        rng = random.Random(0)
+        candidates = []
+        for _ in range(attempts):
+            width, height = rng.randint(3, 10), rng.randint(3, 10)
+            candidates.append(RectangularRoom(
+                rng.randint(0, 200 - width - 1), rng.randint(0, 200 - height - 1), width, height
+            ))
+
+        def intersects() -> int:
+            rooms: List[RectangularRoom] = []
+            for room in candidates:
+                if not any(room.intersects(other) for other in rooms):
+                    rooms.append(room)
+            return len(rooms)
+
+        def bitmap() -> int:
+            placer = RoomPlacer(200, 200)
+            return sum(placer.try_place(room) for room in candidates)
+
+        assert intersects() == bitmap()
+        print(
+            f"{attempts:>10} {bitmap():>8} {time_per_call(intersects, 1):>12.1f}"
+            f" {time_per_call(bitmap, 1):>10.1f}"
+        )
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "fov": bench_fov,
+    "pathing": bench_pathing,
+    "rooms": bench_rooms,
+    "spawning": bench_spawning,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "names", nargs="*", help=f"benchmarks to run, any of: {', '.join(BENCHMARKS)}"
+    )
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,34 @@
 from __future__ import annotations
 
-import random
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from typing import List, Optional, Tuple, TypeVar, TYPE_CHECKING
 
 import numpy as np # type: ignore
 import tcod
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+from engine import FOV_RADIUS
+
+# Enemies only chase a player they can see, so they start within FOV_RADIUS of them,
+# with room beyond that for paths to go around walls
+CHASE_RADIUS = FOV_RADIUS * 2
 
 
 if TYPE_CHECKING:
     from entity import Actor
 
+T = TypeVar("T", bound="BaseAi")
+
 class BaseAi(Action):
     entity: Actor
     def perform(self) -> None:
         raise NotImplementedError()
+
+    def copy(self: T, entity: Actor) -> T:
+        """Return a copy of this AI controlling another entity"""
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.entity = entity
+        return clone
     
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Computer and return a path to the target position
@@ -23,16 +36,10 @@ class BaseAi(Action):
         If there is no valid path then returns an empty list
         """
 
-        # Copy the walkable area
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check that an entity blocks movement and the cost isn't zero (blocking)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position
-                # A lower number means more enemies will crowd behind each other in hallways
-                # A higher number means enemies will take longer paths in order to surround the player
-                cost[entity.x, entity.y] += 10
+        # Blocking entities add to the cost of their tile
+        # A lower number means more enemies will crowd behind each other in hallways
+        # A higher number means enemies will take longer paths in order to surround the player
+        cost = self.entity.gamemap.movement_cost
 
         # Create a graph from the cost array and pass that graph to a new pathfinder
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
@@ -46,23 +53,53 @@ class BaseAi(Action):
         # Convert from List[List[int]] to List[Tuple[int,int]]
         return [(index[0], index[1]) for index in path]
 
+    def get_path_down(
+        self, distance: np.ndarray, origin: Tuple[int, int] = (0, 0)
+    ) -> List[Tuple[int, int]]:
+        """Return the path from this entity downhill along a distance map
+
+        `origin` is the map position of the distance map's corner. The path ends where the
+        map bottoms out, which is the map's root if it can be reached, and is empty if
+        this entity is outside the distance map
+        """
+        origin_x, origin_y = origin
+        start_x, start_y = self.entity.x - origin_x, self.entity.y - origin_y
+        if not (0 <= start_x < distance.shape[0] and 0 <= start_y < distance.shape[1]):
+            return []
+
+        path: List[List[int]] = tcod.path.hillclimb2d(
+            distance, (start_x, start_y), True, True
+        )[1:].tolist()
+
+        return [(index[0] + origin_x, index[1] + origin_y) for index in path]
+
 
 class HostileEnemy(BaseAi):
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
 
+    def copy(self, entity: Actor) -> HostileEnemy:
+        clone = super().copy(entity)
+        clone.path = []
+        return clone
+
     def perform(self) -> None:
         target = self.engine.player
         dx = target.x - self.entity.x
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if self.entity in self.engine.visible_actors:
             if distance <= 1:
                 return MeleeAction(self.entity, dx, dy).perform()
             
-            self.path = self.get_path_to(target.x, target.y)
+            game_map = self.engine.game_map
+            player_distance = game_map.get_player_distance(target.x, target.y, CHASE_RADIUS)
+            self.path = self.get_path_down(player_distance, game_map.player_distance_origin)
+            if not self.path:
+                # The only way to the player leaves the window, so search the whole map
+                self.path = self.get_path_to(target.x, target.y)
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
@@ -86,6 +123,12 @@ class ConfusedEnemey(BaseAi):
         
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
+
+    def copy(self, entity: Actor) -> ConfusedEnemey:
+        clone = super().copy(entity)
+        if self.previous_ai:
+            clone.previous_ai = self.previous_ai.copy(entity)
+        return clone
         
     def perform(self) -> None:
         # Revert the AI back to the original state if the effect has run its course
@@ -97,7 +140,7 @@ class ConfusedEnemey(BaseAi):
             
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = self.engine.rng.choice(
                 [
                     (-1,-1), # Northwest
                     (0, -1), # North
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TypeVar, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
 
+T = TypeVar("T", bound="BaseComponent")
+
 class BaseComponent:
     parent: Entity # Owning entity instance
 
@@ -16,4 +18,15 @@ class BaseComponent:
 
     @property
     def engine(self) -> Engine:
-        return self.gamemap.engine
\ No newline at end of file
+        return self.gamemap.engine
+
+    def copy(self: T) -> T:
+        """Return a copy of this component, without a parent, for a new entity
+
+        Attributes are shared with this component, so components with mutable
+        state, like lists, copy that state themselves
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.pop("parent", None)
+        return clone
\ No newline at end of file
@@ -64,13 +64,10 @@ class LightningDamageConsumable(Consumable):
         target = None
         closest_distance = self.maximum_range + 1.0
         
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-                
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        for actor, distance in self.engine.visible_actors.items():
+            if actor is not consumer and actor.is_alive and distance < closest_distance:
+                target = actor
+                closest_distance = distance
         
         if target:
             self.engine.message_log.add_message(
@@ -137,7 +134,8 @@ class FireballDamageConsumable(Consumable):
             raise Impossible("You cannot target an area you cannot see")
         
         targets_hit = False
-        for actor in self.engine.game_map.actors:
+        # Copy the actors, as any killed by the blast leave the living set
+        for actor in list(self.engine.game_map.actors):
             if actor.distance(*target_xy) <= self.radius:
                 self.engine.message_log.add_message(
                     f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
@@ -13,6 +13,13 @@ class Inventory(BaseComponent):
     def __init__(self, capacity: int):
         self.capacity = capacity
         self.items: List[Item] = []
+
+    def copy(self) -> Inventory:
+        clone = super().copy()
+        clone.items = [item.copy() for item in self.items]
+        for item in clone.items:
+            item.parent = clone
+        return clone
         
     def drop(self, item: Item) -> None:
         """
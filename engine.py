@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import itertools
 import lzma
 import pickle
-from typing import TYPE_CHECKING
+import random
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 from tcod.console import Console
 from tcod.map import compute_fov
 
-
+import numpy as np # type: ignore
 import pygame
 
 
@@ -21,34 +23,115 @@ if TYPE_CHECKING:
     from game_map import GameMap, GameWorld
     from game_surface import GameSurface
 
+FOV_RADIUS = 8
+
+# No tiles, as x and y coordinate arrays
+NO_TILES = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+
+
+def bounding_window(a: Tuple[slice, slice], b: Tuple[slice, slice]) -> Tuple[slice, slice]:
+    """Return the smallest 2D index covering both of these windows"""
+    return tuple(
+        slice(min(a_axis.start, b_axis.start), max(a_axis.stop, b_axis.stop))
+        for a_axis, b_axis in zip(a, b)
+    )
+
 
 class Engine:
     game_map: GameMap
     game_world: GameWorld
     
-    def __init__(self, player: Actor):
+    def __init__(self, player: Actor, seed: Optional[int] = None):
         self.message_log = MessageLog()
+        # Randomness during play, such as confused monsters stumbling around
+        self.rng = random.Random(seed)
         self.mouse_location = (0, 0)
         self.player = player
+        # Counts completed turns, anything drawn from the map is stale once this changes
+        self.turn = 0
+
+        # Tiles that came into and went out of view in the last update_fov, as x and y arrays
+        self.newly_visible: Tuple[np.ndarray, np.ndarray] = NO_TILES
+        self.newly_hidden: Tuple[np.ndarray, np.ndarray] = NO_TILES
+        # What the field of view was last computed for, and the area it covered
+        self._fov_key: Optional[Tuple[GameMap, int, int, int]] = None
+        self._fov_window: Tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+        # Every other actor the player can see, with its distance from the player
+        self.visible_actors: Dict[Actor, float] = {}
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        # Rebuilt by the first enemy to chase the player this turn, if any do
+        self.game_map.player_distance = None
+        for entity in self.game_map.actors - {self.player}:
             if entity.ai:
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass # Ignore impossible actions from AI
+        self.turn += 1
 
     def update_fov(self) -> None:
-        """Recompute the visible area based ont he players point of view."""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
+        """Recompute the visible area based ont he players point of view.
+
+        Nothing is recomputed unless the player moved or the map's tiles changed, and
+        only the tiles in reach of the player now or at the last update are looked at,
+        so the cost doesn't depend on the size of the map
+        """
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+        fov_key = (game_map, x, y, game_map.tiles_version)
+        if fov_key == self._fov_key:
+            self.newly_visible = self.newly_hidden = NO_TILES
+            self.update_visible_actors()
+            return
+
+        # Everything that could change is in the old view or the new one, on a new map
+        # nothing has been seen yet
+        window = game_map.window_around(x, y, FOV_RADIUS)
+        same_map = self._fov_key is not None and self._fov_key[0] is game_map
+        if same_map:
+            changed = bounding_window(window, self._fov_window)
+        else:
+            changed = window
+        was_visible = game_map.visible[changed].copy()
+
+        # Only the last window can hold visible tiles, unless the map was just switched to
+        if same_map:
+            game_map.visible[self._fov_window] = False
+        else:
+            game_map.visible[:] = False
+        game_map.visible[window] = compute_fov(
+            game_map.transparent[window],
+            (x - window[0].start, y - window[1].start),
+            radius=FOV_RADIUS,
         )
 
         # If a tile is "visible" it should be added to "explored"
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[window] |= game_map.visible[window]
+
+        is_visible = game_map.visible[changed]
+        newly_visible_x, newly_visible_y = np.nonzero(is_visible & ~was_visible)
+        newly_hidden_x, newly_hidden_y = np.nonzero(was_visible & ~is_visible)
+        self.newly_visible = (newly_visible_x + changed[0].start, newly_visible_y + changed[1].start)
+        self.newly_hidden = (newly_hidden_x + changed[0].start, newly_hidden_y + changed[1].start)
+
+        self._fov_key = fov_key
+        self._fov_window = window
+
+        self.update_visible_actors()
+
+    def update_visible_actors(self) -> None:
+        """Find the actors in view once a turn, rather than each AI and item checking"""
+        actors = [actor for actor in self.game_map.actors if actor is not self.player]
+        xs = np.fromiter((actor.x for actor in actors), dtype=np.intp, count=len(actors))
+        ys = np.fromiter((actor.y for actor in actors), dtype=np.intp, count=len(actors))
+
+        in_view = self.game_map.visible[xs, ys]
+        distances = np.hypot(xs - self.player.x, ys - self.player.y)
+
+        self.visible_actors = dict(
+            zip(itertools.compress(actors, in_view), distances[in_view].tolist())
+        )
 
     def render(self, console: Console) -> None:
         self.game_map.render(console)
@@ -70,38 +153,72 @@ class Engine:
             location=(0,47)
         )
         
-    def render_pygame(self, screen: GameSurface) -> None:
-        camera = self.game_map.render_window(screen)
-        
-
-        inventory_locations = render_functions.render_inventory(
-            surface=screen.surface,
-            location=(screen.surface.get_width() - 350, 150),
-            width=350, 
-            inventory=self.player.inventory,
-            tile_set=screen.get_tileset("inventory")
-        )
+    def render_pygame(self, screen: GameSurface) -> List[pygame.Rect]:
+        """Render the game, only redrawing the parts of the screen that changed
+
+        Returns the rects that were drawn over, everything is redrawn when
+        `screen.needs_full_redraw` is set
+        """
+        drawn = screen.drawn
+        if screen.needs_full_redraw:
+            drawn.clear()
+            screen.cursor_backing = None
+
+        dirty_rects: List[pygame.Rect] = []
+
+        # Put back what the mouse cursor was covering
+        if screen.cursor_backing:
+            backing, backing_rect = screen.cursor_backing
+            screen.surface.blit(backing, backing_rect)
+            dirty_rects.append(backing_rect)
+            screen.cursor_backing = None
+
+        camera_key = (id(self.game_map), self.turn)
+        if drawn.get("camera") != camera_key:
+            camera = self.game_map.render_window(screen)
+            dirty_rects.append(screen.surface.blit(camera, (0,0)))
+            drawn["camera"] = camera_key
+
+        inventory_key = [(id(item), item.sprIdx) for item in self.player.inventory.items]
+        if drawn.get("inventory") != inventory_key:
+            inventory_locations, inventory_rect = render_functions.render_inventory(
+                surface=screen.surface,
+                location=(screen.surface.get_width() - 350, 150),
+                width=350, 
+                inventory=self.player.inventory,
+                tile_set=screen.get_tileset("inventory")
+            )
+            dirty_rects.append(inventory_rect)
+            drawn["inventory"] = inventory_key
+            drawn["inventory_locations"] = inventory_locations
 
         render_functions.render_box_at_mouse(
             surface=screen.surface,
-            locations=inventory_locations,
+            locations=drawn["inventory_locations"],
             engine=self
         )
 
-        health_bar = render_functions.render_healthbar(
-            currentValue=self.player.fighter.hp,
-            totalValue=self.player.fighter.max_hp,
-            width=250,
-            height=35,
-        )
+        health_key = (self.player.fighter.hp, self.player.fighter.max_hp)
+        if drawn.get("health_bar") != health_key:
+            health_bar = render_functions.render_healthbar(
+                currentValue=self.player.fighter.hp,
+                totalValue=self.player.fighter.max_hp,
+                width=250,
+                height=35,
+            )
+            dirty_rects.append(screen.surface.blit(health_bar, (3,643)))
+            drawn["health_bar"] = health_key
         
         mouse_cursor = render_functions.render_mouse(filename="mouse cursor.png")
+        cursor_rect = mouse_cursor.get_rect(topleft=pygame.mouse.get_pos()).clip(
+            screen.surface.get_rect()
+        )
+        # The pointer can be reported off the surface, such as over the letterbox when scaled
+        if cursor_rect.width and cursor_rect.height:
+            screen.cursor_backing = (screen.surface.subsurface(cursor_rect).copy(), cursor_rect)
+            dirty_rects.append(screen.surface.blit(mouse_cursor, cursor_rect.topleft))
 
-        screen.surface.blits([
-            (camera, (0,0)),
-            (health_bar, (3,643)),
-            (mouse_cursor, pygame.mouse.get_pos())
-        ])        
+        return dirty_rects
 
     def save_as(self, filename: str) -> None:
         """Save this engine instance as a compressed file"""
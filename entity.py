@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import copy
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
@@ -51,31 +50,44 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def copy(self: T) -> T:
+        """Return a new entity made from this one, not yet placed on any map
+
+        Only per-instance state is copied: each component gets its own copy, while
+        names, colors and other immutable settings are shared with this entity
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.pop("parent", None)
+        return clone
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this instance at the given location"""
-        clone = copy.deepcopy(self)
+        clone = self.copy()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location. Handles moving across GameMaps """
+        if hasattr(self, "parent"): # Possibly unitialized
+            if self.parent is self.gamemap:
+                self.gamemap.remove_entity(self)
+                if not gamemap:
+                    gamemap = self.parent
         self.x = x
         self.y = y
         if gamemap:
-            if hasattr(self, "parent"): # Possibly unitialized
-                if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
 
     def distance(self, x: int, y: int) -> float:
         """Returns the distance between the current entity and the given (x,y) coordinate
@@ -91,8 +103,10 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # Move the entity by a given amount
+        old_x, old_y = self.x, self.y
         self.x += dx
         self.y += dy
+        self.gamemap.update_entity_location(self, old_x, old_y)
 
 class Actor(Entity):
     def __init__(
@@ -139,6 +153,30 @@ class Actor(Entity):
         self.level = level
         self.level.parent = self
 
+    def copy(self) -> Actor:
+        clone = super().copy()
+        clone.ai = self.ai.copy(clone) if self.ai else None
+
+        clone.fighter = self.fighter.copy()
+        clone.fighter.parent = clone
+
+        clone.inventory = self.inventory.copy()
+        clone.inventory.parent = clone
+
+        clone.level = self.level.copy()
+        clone.level.parent = clone
+
+        # Equipped items are carried, so they point at the copies in the new inventory
+        copied_items = dict(zip(map(id, self.inventory.items), clone.inventory.items))
+        clone.equipment = self.equipment.copy()
+        clone.equipment.parent = clone
+        for slot in ("weapon", "armor"):
+            item = getattr(self.equipment, slot)
+            if item is not None:
+                setattr(clone.equipment, slot, copied_items.get(id(item)) or item.copy())
+
+        return clone
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions"""
@@ -176,4 +214,17 @@ class Item(Entity):
         
         self.equippable = equippable
         if self.equippable:
-            self.equippable.parent = self
\ No newline at end of file
+            self.equippable.parent = self
+
+    def copy(self) -> Item:
+        clone = super().copy()
+
+        if self.consumable:
+            clone.consumable = self.consumable.copy()
+            clone.consumable.parent = clone
+
+        if self.equippable:
+            clone.equippable = self.equippable.copy()
+            clone.equippable.parent = clone
+
+        return clone
\ No newline at end of file
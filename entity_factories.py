@@ -1,3 +1,5 @@
+from typing import Dict, Union
+
 from components.ai import HostileEnemy
 from components import consumable, equippable
 from components.fighter import Fighter
@@ -99,4 +101,24 @@ chain_mail = Item(
     char="[", color=(139, 69, 19),
     name="Chain Mail",
     equippable=equippable.ChainMail()
-)
\ No newline at end of file
+)
+
+# Every template by name. Templates are never placed or changed themselves, entities are
+# made from them with create or spawn, which copy only the state each instance changes
+prototypes: Dict[str, Union[Actor, Item]] = {
+    "player": player,
+    "orc": orc,
+    "troll": troll,
+    "health_potion": health_potion,
+    "lightning_scroll": lightning_scroll,
+    "confusion_scroll": confusion_scroll,
+    "fireball_scroll": fireball_scroll,
+    "dagger": dagger,
+    "sword": sword,
+    "leather_armor": leather_armor,
+    "chain_mail": chain_mail,
+}
+
+def create(name: str) -> Union[Actor, Item]:
+    """Return a new entity, not on any map, made from the named template"""
+    return prototypes[name].copy()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 
-from typing import Any, Callable, Optional, Tuple, TypeVar, TYPE_CHECKING, Union
+from typing import Any, Callable, List, Optional, Tuple, TypeVar, TYPE_CHECKING, Union
 
 import pygame
 
@@ -88,7 +88,11 @@ class BaseEventHandler():
     def ev_mousebuttonup(sef, event: pygame.event.Event) -> Optional[T]:
         """Called when the mousebutton is up"""
 
-    def on_render(self, screen: GameSurface) -> None:
+    def on_render(self, screen: GameSurface) -> Optional[List[pygame.Rect]]:
+        """Render to the screen, returning the rects drawn over
+
+        Returning None means the whole screen was drawn and it will be cleared before the next frame
+        """
         raise NotImplementedError()
     
 class ActionInputHandler(BaseEventHandler):
@@ -129,8 +133,8 @@ class ActionInputHandler(BaseEventHandler):
         self.engine.update_fov()
         return True
     
-    def on_render(self, screen: GameSurface) -> None:
-        self.engine.render_pygame(screen)
+    def on_render(self, screen: GameSurface) -> List[pygame.Rect]:
+        return self.engine.render_pygame(screen)
 
 class MainGameHandler(ActionInputHandler):
     def ev_keydown(self, event: pygame.event) -> Optional[ActionOrHandler]:
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING, Tuple, List
+from concurrent.futures import Future, ThreadPoolExecutor
+import random
+from typing import Dict, Iterable, Optional, Set, TYPE_CHECKING, Tuple, List
 
 import numpy as np # type: ignore
+import tcod
 from tcod.console import Console
 
 import pygame
@@ -16,6 +19,13 @@ if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_surface import GameSurface
+
+# How a tile was last drawn to the map layer
+TILE_UNSEEN = 0
+TILE_REMEMBERED = 1
+TILE_LIT = 2
+# Forces a tile to be redrawn, such as one just scrolled into the layer
+TILE_STALE = -1
     
 
 class GameMap:
@@ -24,9 +34,32 @@ class GameMap:
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities =set(entities)
+        self.entities: Set[Entity] = set()
+        # Entities keyed by their (x, y) position, for constant time lookups
+        self.entity_index: Dict[Tuple[int, int], Set[Entity]] = {}
+        # Entities sorted by kind, so iterating them doesn't touch every entity
+        self._actors: Set[Actor] = set()
+        self._corpses: Set[Actor] = set()
+        self._items: Set[Item] = set()
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
 
+        # Contiguous copies of the tiles' flags, so field of view, movement and pathfinding
+        # don't read a field out of every tile record
+        self.walkable = np.array(self.tiles["walkable"], order="F")
+        self.transparent = np.array(self.tiles["transparent"], order="F")
+
+        # Pathfinding cost of each tile, kept up to date as tiles and blocking entities change
+        # Zero is impassable, and each blocking entity on a tile adds 10 to its cost
+        self.movement_cost = np.array(self.walkable, dtype=np.int8, order="F")
+        self._blocker_count = np.zeros((width, height), dtype=np.int8, order="F")
+        self._blocking: Set[Entity] = set()
+
+        # Changes whenever tiles are written, so field of view knows when to recompute
+        self.tiles_version = 0
+
+        for entity in entities:
+            self.add_entity(entity)
+
         self.visible = np.full(
             (width, height), fill_value=False, order="F"
         ) # Tiles the player can currently see
@@ -35,6 +68,19 @@ class GameMap:
             ) # Tiles the player has seen before
         
         self.downstairs_location = (0,0)
+        # Where the player arrives on this floor
+        self.start_location = (0,0)
+
+        # Distance to the player from each tile in a window around them, built the first time
+        # an enemy chases the player in a turn, and the map position of the window's corner
+        self.player_distance: Optional[np.ndarray] = None
+        self.player_distance_origin = (0, 0)
+
+        # The tiles under the camera pre-rendered by render_window, the TILE_* state
+        # each was drawn in, and the map position of the layer's top left tile
+        self._map_layer: Optional[pygame.Surface] = None
+        self._map_layer_state = np.zeros((0, 0), dtype=np.int8)
+        self._map_layer_origin = (0, 0)
 
     @property
     def gamemap(self) -> GameMap:
@@ -42,39 +88,140 @@ class GameMap:
 
 
 
-    @property
-    def actors(self) -> Iterator[Actor]:
-        """Iterate over this maps living actors"""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location"""
+        self.entities.add(entity)
+        self.entity_index.setdefault((entity.x, entity.y), set()).add(entity)
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self._actors.add(entity)
+            else:
+                self._corpses.add(entity)
+        elif isinstance(entity, Item):
+            self._items.add(entity)
+        if entity.blocks_movement:
+            self._blocking.add(entity)
+            self._change_blocker_count(entity.x, entity.y, 1)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map, it must still be at its indexed location"""
+        self.entities.remove(entity)
+        self._unindex(entity, entity.x, entity.y)
+        self._actors.discard(entity)
+        self._corpses.discard(entity)
+        self._items.discard(entity)
+        if entity in self._blocking:
+            self._blocking.remove(entity)
+            self._change_blocker_count(entity.x, entity.y, -1)
+
+    def register_death(self, actor: Actor) -> None:
+        """Move an actor that has just died from the living actors to the corpses"""
+        self._actors.discard(actor)
+        self._corpses.add(actor)
+        if actor in self._blocking and not actor.blocks_movement:
+            self._blocking.remove(actor)
+            self._change_blocker_count(actor.x, actor.y, -1)
+
+    def update_entity_location(self, entity: Entity, old_x: int, old_y: int) -> None:
+        """Move an entity in the location index after its x and y have changed"""
+        self._unindex(entity, old_x, old_y)
+        self.entity_index.setdefault((entity.x, entity.y), set()).add(entity)
+        if entity in self._blocking:
+            self._change_blocker_count(old_x, old_y, -1)
+            self._change_blocker_count(entity.x, entity.y, 1)
+
+    def set_tiles(self, index, tile: np.ndarray) -> None:
+        """Write tiles to the map, `index` is anything that can index the tiles array
+
+        Use this rather than assigning to `tiles` when walkability may change,
+        so `walkable`, `transparent` and the movement costs stay in sync
+        """
+        self.tiles[index] = tile
+        self.walkable[index] = tile["walkable"]
+        self.transparent[index] = tile["transparent"]
+        self.tiles_version += 1
+        self._map_layer = None # Redraw the map layer with the new tiles
+        self.movement_cost[index] = self.walkable[index] * (
+            1 + 10 * self._blocker_count[index]
+        )
+
+    def window_around(self, x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        """Return the area within `radius` tiles of (x, y), clipped to the map, as a 2D index"""
+        return (
+            slice(max(0, x - radius), min(self.width, x + radius + 1)),
+            slice(max(0, y - radius), min(self.height, y + radius + 1)),
         )
+
+    def _change_blocker_count(self, x: int, y: int, amount: int) -> None:
+        self._blocker_count[x, y] += amount
+        if self.walkable[x, y]:
+            self.movement_cost[x, y] = 1 + 10 * self._blocker_count[x, y]
+
+    def _unindex(self, entity: Entity, x: int, y: int) -> None:
+        bucket = self.entity_index[x, y]
+        bucket.remove(entity)
+        if not bucket:
+            del self.entity_index[x, y]
+
+    def get_entities_at_location(self, x: int, y: int) -> Set[Entity]:
+        """Return every entity at the given location"""
+        return self.entity_index.get((x, y), set())
+
+    @property
+    def actors(self) -> Set[Actor]:
+        """This maps living actors
+
+        The set is live, iterate over a copy if actors may die or leave while looping
+        """
+        return self._actors
+
+    @property
+    def corpses(self) -> Set[Actor]:
+        """This maps dead actors"""
+        return self._corpses
         
     @property
-    def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def items(self) -> Set[Item]:
+        """Items lying on this map, not those held in an inventory"""
+        return self._items
 
     def get_blocking_entity_at_location(
         self, location_x: int, location_y: int
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x 
-                and entity.y == location_y
-            ):
+        for entity in self.get_entities_at_location(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
             
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         
         return None
 
+    def get_player_distance(self, x: int, y: int, radius: int) -> np.ndarray:
+        """Return the walking distance to the player at (x, y) from the tiles within `radius`
+
+        The map is built on the first call after `player_distance` is reset to None, which
+        the engine does each enemy turn, so every chasing enemy can walk downhill on the
+        same map instead of running its own pathfinder. Index it relative to
+        `player_distance_origin`
+        """
+        if self.player_distance is None:
+            window = self.window_around(x, y, radius)
+            origin_x, origin_y = window[0].start, window[1].start
+            distance = tcod.path.maxarray(
+                (window[0].stop - origin_x, window[1].stop - origin_y), dtype=np.int32, order="F"
+            )
+            distance[x - origin_x, y - origin_y] = 0
+            self.player_distance = tcod.path.dijkstra2d(
+                distance, self.movement_cost[window], 2, 3, out=distance
+            )
+            self.player_distance_origin = (origin_x, origin_y)
+        return self.player_distance
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
@@ -106,10 +253,12 @@ class GameMap:
                 )
 
     def render_window(self, screen: GameSurface) -> pygame.Surface:
-        first_floor_tileset = screen.get_tileset("first_floor_sheet")
-        character_sprites = screen.get_tileset("characters")
-        inventory_sprites = screen.get_tileset("inventory")
+        """Render the part of the map around the player that fits in the camera
 
+        Only tiles within the camera are looked at, so the cost of a frame
+        depends on the camera size rather than the map size
+        """
+        character_sprites = screen.get_tileset("characters")
         
         scale = character_sprites.scale
         tile_size = character_sprites.tile_size * scale
@@ -119,70 +268,109 @@ class GameMap:
 
         camera_width = 930
         camera_height = 640
+        camera_x = player_x * tile_size - camera_width // 2
+        camera_y = player_y * tile_size - camera_height // 2
 
-
-        game_map = pygame.Surface((1280 * scale, 800 * scale))
         camera = pygame.Surface((camera_width,camera_height))
 
-        window_tile_height = 30
-        window_tile_width = 50
-
-        # window_visible = visible_tiles[x-10:y-10:x+10:y+10]
-        
-        starting_x_index = min([0,  player_x - (window_tile_width // 2)])
-        starting_y_index = min([0, player_y - (window_tile_height // 2)])
-        
         black = 0, 0, 0
-        game_map.fill(black)
-
-        with np.nditer(self.tiles, flags=["multi_index"]) as row:
-            for tile in row:
-                tile_x, tile_y = row.multi_index[0], row.multi_index[1]
-                if self.explored[tile_x, tile_y]:
-                    
-                    spr_name = str(tile["name"])
-                    tile_img: pygame.Surface = first_floor_tileset.get_sprite(spr_name)
-                    try:
-                        if not self.visible[tile_x, tile_y]:
-                            tile_img.set_alpha(95)
-                        else:
-                            tile_img.set_alpha()
-                    except AttributeError:
-                        print(spr_name, tile)
-                        raise
-                    game_map.blit(tile_img, (tile_x * tile_size, tile_y * tile_size))
-                    
+
+        # The tiles under the camera, which may hang off the edges of the map
+        origin_x, origin_y = camera_x // tile_size, camera_y // tile_size
+        columns = -(-camera_width // tile_size) + 1
+        rows = -(-camera_height // tile_size) + 1
+
+        if self._map_layer is None or self._map_layer.get_size() != (columns * tile_size, rows * tile_size):
+            # The tiles are drawn once to this layer, then only redrawn when they change
+            self._map_layer = pygame.Surface((columns * tile_size, rows * tile_size))
+            self._map_layer_state = np.full((columns, rows), fill_value=TILE_STALE, dtype=np.int8)
+            self._map_layer_origin = origin_x, origin_y
+
+        # Scroll the layer along with the camera, only the uncovered tiles need drawing
+        dx = origin_x - self._map_layer_origin[0]
+        dy = origin_y - self._map_layer_origin[1]
+        if dx or dy:
+            scrolled_state = np.full((columns, rows), fill_value=TILE_STALE, dtype=np.int8)
+            if abs(dx) < columns and abs(dy) < rows:
+                self._map_layer.scroll(-dx * tile_size, -dy * tile_size)
+                scrolled_state[
+                    max(0, -dx):columns - max(0, dx), max(0, -dy):rows - max(0, dy)
+                ] = self._map_layer_state[
+                    max(0, dx):columns - max(0, -dx), max(0, dy):rows - max(0, -dy)
+                ]
+            self._map_layer_state = scrolled_state
+            self._map_layer_origin = origin_x, origin_y
+
+        # What each tile should currently look like, compared to how it was last drawn
+        tile_state = np.full((columns, rows), fill_value=TILE_UNSEEN, dtype=np.int8)
+        x1, x2 = max(origin_x, 0), min(origin_x + columns, self.width)
+        y1, y2 = max(origin_y, 0), min(origin_y + rows, self.height)
+        window = slice(x1, x2), slice(y1, y2)
+        if x1 < x2 and y1 < y2:
+            tile_state[x1 - origin_x:x2 - origin_x, y1 - origin_y:y2 - origin_y] = np.where(
+                self.visible[window],
+                TILE_LIT,
+                np.where(self.explored[window], TILE_REMEMBERED, TILE_UNSEEN),
+            )
+        changed_columns, changed_rows = np.nonzero(tile_state != self._map_layer_state)
+
+        for column, row in zip(changed_columns.tolist(), changed_rows.tolist()):
+            self._map_layer.fill(black, (column * tile_size, row * tile_size, tile_size, tile_size))
+
+        # Pick the sprite for every changed tile that has been seen at once, by tile id
+        seen = tile_state[changed_columns, changed_rows] != TILE_UNSEEN
+        changed_columns, changed_rows = changed_columns[seen], changed_rows[seen]
+        changed_tile_ids = self.tiles["tile_id"][changed_columns + origin_x, changed_rows + origin_y]
+        sprite_ids = np.where(
+            tile_state[changed_columns, changed_rows] == TILE_REMEMBERED,
+            screen.get_tile_sprite_ids("first_floor_sheet", tile_types.tile_names, remembered=True)[changed_tile_ids],
+            screen.get_tile_sprite_ids("first_floor_sheet", tile_types.tile_names)[changed_tile_ids],
+        )
+
+        tile_atlas = screen.tile_atlas
+        tile_blits = [
+            (tile_atlas.surface, (column * tile_size, row * tile_size), tile_atlas.rects[sprite_id])
+            for column, row, sprite_id
+            in zip(changed_columns.tolist(), changed_rows.tolist(), sprite_ids.tolist())
+        ]
+        self._map_layer.blits(tile_blits, doreturn=False)
+        self._map_layer_state = tile_state
+
+        # Only entities in the FOV are drawn, so only visible tiles in the camera are checked
+        entities_in_camera: List[Entity] = []
+        if x1 < x2 and y1 < y2:
+            visible_x, visible_y = np.nonzero(self.visible[window])
+            for x, y in zip((visible_x + x1).tolist(), (visible_y + y1).tolist()):
+                entities_in_camera.extend(self.get_entities_at_location(x, y))
 
         entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
+            entities_in_camera, key=lambda x: x.render_order.value
         )
 
-        entity_sprites: List[Tuple[pygame.Surface, Tuple[int, int]]] = []
+        entity_blits: List[Tuple[pygame.Surface, Tuple[int, int], pygame.Rect]] = []
 
+        atlas = screen.atlas
         for entity in entities_sorted_for_rendering:
-            # Only print entities that are in the FOV
-            if self.visible[entity.x, entity.y]:
-                if entity.sprIdx != -1:
-                    if entity.sprite_sheet == "characters":
-                        img = character_sprites.get_sprite(entity.sprIdx)
-                    elif entity.sprite_sheet == "inventory":
-                        img = inventory_sprites.get_sprite(entity.sprIdx)
-                    elif entity.sprite_sheet == "character_sheet":
-                        img = screen.get_sprite_from_tilesheet("character_sheet", entity.sprite_name)
-                    else:
-                        img = screen.not_implemented[0]
-                    entity_sprites.append((img, (entity.x * tile_size, entity.y * tile_size)))
-                    # game_map.blit(img, (entity.x * tile_size, entity.y * tile_size))
-        
-        game_map.blits(entity_sprites)
-  
-        camera.fill(black)
+            if entity.sprIdx != -1:
+                entity_blits.append((
+                    atlas.surface,
+                    (entity.x * tile_size - camera_x, entity.y * tile_size - camera_y),
+                    atlas.rects[screen.get_entity_sprite_id(entity)],
+                ))
+
         camera.blit(
-            game_map, 
+            self._map_layer, 
             (0,0), 
-            (player_x * tile_size - camera_width // 2, player_y * tile_size - camera_height // 2, camera_width, camera_height)
+            (camera_x - origin_x * tile_size, camera_y - origin_y * tile_size, camera_width, camera_height)
         )
+        camera.blits(entity_blits, doreturn=False)
         return camera
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # Surfaces can't be pickled, the map layer is redrawn after loading
+        state["_map_layer"] = None
+        return state
         
 
 
@@ -200,7 +388,8 @@ class GameWorld:
         max_rooms: int,
         room_min_size: int,
         room_max_size: int,
-        current_floor: int = 0
+        current_floor: int = 0,
+        seed: Optional[int] = None
     ):
         self.engine = engine
         
@@ -214,17 +403,64 @@ class GameWorld:
         
         
         self.current_floor = current_floor
-        
-    def generate_floor(self) -> None:
+
+        # Every floor is generated from this seed, so the same seed makes the same dungeon
+        self.seed = random.getrandbits(64) if seed is None else seed
+
+        # The next floor, being generated in the background while this one is played
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._next_floor: Optional[Future[GameMap]] = None
+
+    def __getstate__(self) -> dict:
+        """Don't save the background generation, the next floor is rebuilt from its seed"""
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_next_floor"] = None
+        return state
+
+    def floor_rng(self, floor_number: int) -> random.Random:
+        """Return a new generator for this floor, independent of every other floor's
+
+        A floor comes out the same whether it's built ahead of time, on the stairs or
+        in another process
+        """
+        return random.Random(f"{self.seed}:floor:{floor_number}")
+
+    def _build_floor(self, floor_number: int) -> GameMap:
         from procgen import generate_dungeon
-        
-        self.current_floor += 1
-        
-        self.engine.game_map = generate_dungeon(
+
+        return generate_dungeon(
             max_rooms = self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
             map_width=self.map_width,
             map_height=self.map_height,
-            engine=self.engine
-        )
\ No newline at end of file
+            engine=self.engine,
+            floor_number=floor_number,
+            rng=self.floor_rng(floor_number),
+        )
+
+    def prefetch_next_floor(self) -> None:
+        """Start generating the floor below this one in the background, if it isn't already"""
+        if self._next_floor is not None:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="floor")
+        self._next_floor = self._executor.submit(self._build_floor, self.current_floor + 1)
+
+    def generate_floor(self) -> None:
+        """Move the player down to the next floor, waiting for it if it's still being built"""
+        if self._next_floor is not None:
+            dungeon = self._next_floor.result()
+            self._next_floor = None
+        else:
+            dungeon = self._build_floor(self.current_floor + 1)
+
+        self.current_floor += 1
+
+        # Hand the floor over to the live engine before the player arrives
+        dungeon.engine = self.engine
+        self.engine.player.place(*dungeon.start_location, dungeon)
+        self.engine.game_map = dungeon
+
+        self.prefetch_next_floor()
\ No newline at end of file
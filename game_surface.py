@@ -1,12 +1,57 @@
-from typing import Dict, List, Tuple, Union
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING, Union
 
 import os
+
+import numpy as np # type: ignore
 import pygame
 
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+
+# Loaded assets keyed by the arguments used to load them, so each file is
+# only decoded and scaled once. Cached surfaces are shared, so don't modify them
+_asset_cache: Dict[Tuple[Any, ...], Any] = {}
+_asset_cache_hits = 0
+_asset_cache_misses = 0
+
+def _cached_asset(key: Tuple[Any, ...], load: Any) -> Any:
+    global _asset_cache_hits, _asset_cache_misses
+    try:
+        asset = _asset_cache[key]
+    except KeyError:
+        _asset_cache_misses += 1
+        asset = _asset_cache[key] = load()
+    else:
+        _asset_cache_hits += 1
+    return asset
 
+def asset_cache_info() -> Dict[str, int]:
+    """Return the asset cache's hit and miss counts, and how many assets it holds"""
+    return {"hits": _asset_cache_hits, "misses": _asset_cache_misses, "size": len(_asset_cache)}
 
+def clear_asset_cache() -> None:
+    global _asset_cache_hits, _asset_cache_misses
+    _asset_cache.clear()
+    _asset_cache_hits = _asset_cache_misses = 0
+
+def _colorkey_key(colorkey: Any) -> Any:
+    """Return colorkey in a hashable form for cache keys"""
+    if colorkey is None or isinstance(colorkey, int):
+        return colorkey
+    return tuple(colorkey)
 
 def load_image(name, colorkey=None, scale=1):
+    image = _cached_asset(
+        ("image", name, _colorkey_key(colorkey), scale),
+        lambda: _load_image(name, colorkey, scale)
+    )
+    return image, image.get_rect()
+
+def _load_image(name, colorkey=None, scale=1) -> pygame.Surface:
     image = pygame.image.load(name).convert()
 
     size = image.get_size()
@@ -17,9 +62,15 @@ def load_image(name, colorkey=None, scale=1):
         if colorkey == -1:
             colorkey = image.get_at((0,0))
         image.set_colorkey(colorkey, pygame.RLEACCEL)
-    return image, image.get_rect()
+    return image
+
+def load_tiles(filename: str, width: int, height: int, colorKey=None, scale: int=1) -> List[List[pygame.Surface]]: 
+    return _cached_asset(
+        ("tiles", filename, width, height, _colorkey_key(colorKey), scale),
+        lambda: _load_tiles(filename, width, height, colorKey, scale)
+    )
 
-def load_tiles(filename: str, width: int, height: int, colorKey=None, scale: int=1) -> List[pygame.Surface]: 
+def _load_tiles(filename: str, width: int, height: int, colorKey=None, scale: int=1) -> List[List[pygame.Surface]]: 
     image, rect = load_image(filename, colorKey, scale)
     image_width, image_height = image.get_size()
     tile_table = []
@@ -32,6 +83,14 @@ def load_tiles(filename: str, width: int, height: int, colorKey=None, scale: int
     return tile_table
 
 def load_defined_tiles(
+    filename: str, tiles: Dict[str, Tuple[int, int, int, int]], colorKey=None, scale: int=1
+    ) -> Dict[str, pygame.Surface]:
+        return _cached_asset(
+            ("defined_tiles", filename, tuple(tiles.items()), _colorkey_key(colorKey), scale),
+            lambda: _load_defined_tiles(filename, tiles, colorKey, scale)
+        )
+
+def _load_defined_tiles(
     filename: str, tiles: Dict[str, Tuple[int, int, int, int]], colorKey=None, scale: int=1
     ) -> Dict[str, pygame.Surface]:
         image, rect = load_image(filename, colorKey, scale)
@@ -42,6 +101,20 @@ def load_defined_tiles(
             
         return tile_dict
 
+def dim_sprite(sprite: pygame.Surface, alpha: int = 95) -> pygame.Surface:
+    """Return an opaque copy of sprite faded towards black, for tiles seen before but not in view"""
+    faded = sprite.copy()
+    faded.set_alpha(alpha)
+
+    dimmed = pygame.Surface(sprite.get_size()).convert()
+    colorkey = sprite.get_colorkey()
+    if colorkey is not None:
+        # Keyed out pixels aren't blitted, so they stay transparent in the dimmed copy
+        dimmed.fill(colorkey)
+        dimmed.set_colorkey(colorkey, pygame.RLEACCEL)
+    dimmed.blit(faded, (0, 0))
+    return dimmed
+
 class Tile():
     def __init__():
         pass
@@ -54,20 +127,31 @@ class TileSet():
         self.tile_size = tile_size
         self.scale = scale
         self.sprites = load_tiles(filename, tile_size, tile_size, colorKey, scale)
+        self.remembered_sprites = [[dim_sprite(sprite) for sprite in line] for line in self.sprites]
 
         filepath = os.path.join("images", "not implemented.png")
         self.not_implemented = load_image(filepath, scale=2)
+        self.remembered_not_implemented = dim_sprite(self.not_implemented[0])
         
     def get_tiles(self):
         return self.sprites
+
+    def all_sprites(self) -> List[pygame.Surface]:
+        """Return every sprite this tile set can hand out, including dimmed variants"""
+        sprites = [self.not_implemented[0], self.remembered_not_implemented]
+        for line, remembered_line in zip(self.sprites, self.remembered_sprites):
+            sprites += line + remembered_line
+        return sprites
     
-    def get_sprite(self, index):
+    def get_sprite(self, index, remembered: bool = False):
+        """Return a sprite by index, the dimmed variant if it is `remembered` rather than in view"""
+        sprites = self.remembered_sprites if remembered else self.sprites
         if index == -1:
-            return self.not_implemented[0]
+            return self.remembered_not_implemented if remembered else self.not_implemented[0]
         try:
-            sprite = self.sprites[index][0]
+            sprite = sprites[index][0]
         except Exception:
-            sprite = self.not_implemented[0]
+            sprite = self.remembered_not_implemented if remembered else self.not_implemented[0]
         return  sprite
 
 class DefinedTileSet(TileSet):
@@ -79,31 +163,175 @@ class DefinedTileSet(TileSet):
         self.scale = scale
         self.sprites = load_defined_tiles(
             filename=filename, tiles=tiles,  colorKey=colorKey, scale=scale)
+        self.remembered_sprites = {
+            name: dim_sprite(sprite) for name, sprite in self.sprites.items()
+        }
         
         filepath = os.path.join("images", "not implemented.png")
         self.not_implemented = load_image(filepath, scale=2)
+        self.remembered_not_implemented = dim_sprite(self.not_implemented[0])
         
-    def get_sprite(self, name: str) -> pygame.Surface:
+    def get_sprite(self, name: str, remembered: bool = False) -> pygame.Surface:
+        """Return a sprite by name, the dimmed variant if it is `remembered` rather than in view"""
         if not name:
-            return self.not_implemented[0]
+            return self.remembered_not_implemented if remembered else self.not_implemented[0]
+        if remembered:
+            return self.remembered_sprites[name]
         return self.sprites[name]
 
+    def all_sprites(self) -> List[pygame.Surface]:
+        """Return every sprite this tile set can hand out, including dimmed variants"""
+        return [
+            self.not_implemented[0],
+            self.remembered_not_implemented,
+            *self.sprites.values(),
+            *self.remembered_sprites.values(),
+        ]
+
+class SpriteAtlas():
+    """Sprites packed into a single surface, each addressed by an integer id
+
+    Drawing from one surface lets a whole frame of sprites go out in one `blits` call.
+    An `opaque` atlas flattens its sprites onto black so they are copied rather than blended
+    """
+    def __init__(
+        self, sprites: Iterable[pygame.Surface], max_width: int = 2048, opaque: bool = False
+    ):
+        self.sprites: List[pygame.Surface] = []
+        self._ids: Dict[int, int] = {} # id() of each sprite to its index
+        for sprite in sprites:
+            if id(sprite) not in self._ids:
+                self._ids[id(sprite)] = len(self.sprites)
+                self.sprites.append(sprite)
+
+        # Pack the sprites onto shelves, tallest first so each shelf wastes little height
+        self.rects: List[pygame.Rect] = [pygame.Rect(0, 0, 0, 0)] * len(self.sprites)
+        shelf_x = shelf_y = shelf_height = atlas_width = 0
+        for index in sorted(range(len(self.sprites)), key=lambda i: -self.sprites[i].get_height()):
+            sprite_width, sprite_height = self.sprites[index].get_size()
+            if shelf_x + sprite_width > max_width:
+                shelf_x, shelf_y, shelf_height = 0, shelf_y + shelf_height, 0
+            self.rects[index] = pygame.Rect(shelf_x, shelf_y, sprite_width, sprite_height)
+            shelf_x += sprite_width
+            shelf_height = max(shelf_height, sprite_height)
+            atlas_width = max(atlas_width, shelf_x)
+
+        size = (max(atlas_width, 1), max(shelf_y + shelf_height, 1))
+        if opaque:
+            self.surface = pygame.Surface(size).convert()
+            self.surface.fill((0, 0, 0))
+        else:
+            # Per pixel alpha keeps every sheet's colorkeyed pixels transparent in the one surface
+            self.surface = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+            self.surface.fill((0, 0, 0, 0))
+        self.surface.blits(list(zip(self.sprites, self.rects)), doreturn=False)
+
+    def get_id(self, sprite: pygame.Surface) -> int:
+        """Return the id of a sprite that was packed into this atlas"""
+        return self._ids[id(sprite)]
+
 class GameSurface():
     def __init__(self, width: int, height: int, base_path: str = "images"):
         self.surface = pygame.display.set_mode((width, height), pygame.SCALED)
         self.tilesets: Dict[TileSet] = {}
         self.base_path = base_path
 
+        # Set when everything on screen must be redrawn, such as after the handler changes
+        self.needs_full_redraw = True
+        # What was last drawn to each part of the screen, so unchanged parts can be skipped
+        self.drawn: Dict[str, Any] = {}
+        # The pixels under the mouse cursor, put back before the cursor is drawn again
+        self.cursor_backing: Optional[Tuple[pygame.Surface, pygame.Rect]] = None
+
         filepath = os.path.join(self.base_path, "not implemented.png")
         self.not_implemented = load_image(filepath, scale=2)
 
+        self._atlas: Optional[SpriteAtlas] = None
+        self._tile_atlas: Optional[SpriteAtlas] = None
+        # Atlas ids already looked up for each kind of entity and tile
+        self._entity_sprite_ids: Dict[Tuple[Optional[str], Optional[str], int], int] = {}
+        self._tile_sprite_ids: Dict[Tuple[str, str, bool], int] = {}
+        self._tile_sprite_id_arrays: Dict[Tuple[str, Tuple[str, ...], bool], np.ndarray] = {}
+
     def load_tile_sheet(self, name, filepath, tile_size: int=16, scale: int=1, colorKey=None):
         filepath = os.path.join(self.base_path, filepath)
         self.tilesets[name] = TileSet(filepath, tile_size=tile_size, scale=scale, colorKey=colorKey)
+        self._atlas = self._tile_atlas = None
         
     def load_defined_tile_sheet(self, name: str, filepath: str, tiles: Dict[str, Tuple[int,int,int,int]], scale: int=1, colorKey=None):
         filepath = os.path.join(self.base_path, filepath)
         self.tilesets[name] = DefinedTileSet(filepath, tiles=tiles, scale=scale, colorKey=colorKey)
+        self._atlas = self._tile_atlas = None
+
+    @property
+    def atlas(self) -> SpriteAtlas:
+        """Every sprite of the loaded tile sheets packed together keeping transparency, for entities"""
+        if self._atlas is None:
+            self.build_atlas()
+        return self._atlas
+
+    @property
+    def tile_atlas(self) -> SpriteAtlas:
+        """Every sprite of the loaded tile sheets packed together on black, for map tiles"""
+        if self._tile_atlas is None:
+            self.build_atlas()
+        return self._tile_atlas
+
+    def build_atlas(self) -> None:
+        sprites = [self.not_implemented[0]]
+        for tileset in self.tilesets.values():
+            sprites += tileset.all_sprites()
+        # Map tiles are drawn over black cells, so flattening them onto black looks the same
+        # and lets them skip alpha blending. Both atlases hold every sprite, so any sheet
+        # can be used for tiles or entities
+        self._tile_atlas = SpriteAtlas(sprites, opaque=True)
+        self._atlas = SpriteAtlas(sprites)
+        self._entity_sprite_ids.clear()
+        self._tile_sprite_ids.clear()
+        self._tile_sprite_id_arrays.clear()
+
+    def get_entity_sprite_id(self, entity: Entity) -> int:
+        """Return the atlas id of an entity's sprite, this is only worked out once per kind of entity"""
+        key = (entity.sprite_sheet, entity.sprite_name, entity.sprIdx)
+        try:
+            return self._entity_sprite_ids[key]
+        except KeyError:
+            pass
+
+        tileset = self.tilesets.get(entity.sprite_sheet)
+        if isinstance(tileset, DefinedTileSet):
+            sprite = self.get_sprite_from_tilesheet(entity.sprite_sheet, entity.sprite_name)
+        elif tileset is not None:
+            sprite = tileset.get_sprite(entity.sprIdx)
+        else:
+            sprite = self.not_implemented[0]
+
+        sprite_id = self._entity_sprite_ids[key] = self.atlas.get_id(sprite)
+        return sprite_id
+
+    def get_tile_sprite_ids(
+        self, tilesheet: str, names: Sequence[str], remembered: bool = False
+    ) -> np.ndarray:
+        """Return an array of the tile atlas id for each of `names`, to look up many tiles at once"""
+        key = (tilesheet, tuple(names), remembered)
+        try:
+            return self._tile_sprite_id_arrays[key]
+        except KeyError:
+            sprite_ids = self._tile_sprite_id_arrays[key] = np.array(
+                [self.get_tile_sprite_id(tilesheet, name, remembered) for name in names],
+                dtype=np.intc
+            )
+            return sprite_ids
+
+    def get_tile_sprite_id(self, tilesheet: str, name: str, remembered: bool = False) -> int:
+        """Return the tile atlas id of a named sprite from a tile sheet"""
+        key = (tilesheet, name, remembered)
+        try:
+            return self._tile_sprite_ids[key]
+        except KeyError:
+            sprite = self.get_tileset(tilesheet).get_sprite(name, remembered=remembered)
+            sprite_id = self._tile_sprite_ids[key] = self.tile_atlas.get_id(sprite)
+            return sprite_id
 
     def get_tileset(self, name) -> Union[TileSet, DefinedTileSet]:
         return self.tilesets[name]
@@ -1,7 +1,8 @@
 """All of this is based on the TCOD roguelike tutorial (2020) found at http://rogueliketutorials.com"""
 
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
+import argparse
 import traceback
 
 import os, pygame
@@ -23,7 +24,15 @@ def save_game(handler: event_handlers.base_event_handler.BaseEventHandler, filen
 
 
 
-def main() -> None:
+def main(
+    wait_for_events: bool = True, event_timeout: int = 0, max_fps: int = 60, seed: Optional[int] = None
+) -> None:
+    """Run the game
+
+    With `wait_for_events` the loop sleeps until there is input instead of polling,
+    waking every `event_timeout` milliseconds when that is set, for animations.
+    Frames are capped to `max_fps` either way. New games use `seed` when it is set
+    """
     pygame.init()
     #screen = pygame.display.set_mode((1280,800), pygame.SCALED)
    # pygame.display.set_caption("TESTING")
@@ -96,30 +105,55 @@ def main() -> None:
         scale=4,
         colorKey=-1
     )
+    screen.build_atlas()
     
-    handler: event_handlers.base_event_handler = setup_game.MainMenu()
+    handler: event_handlers.base_event_handler = setup_game.MainMenu(seed=seed)
 
     # screen = pygame.display.set_mode((1280,800), pygame.SCALED)
     pygame.display.set_caption("DATA CRAWLERS")
     pygame.mouse.set_visible(False)
+    clock = pygame.time.Clock()
     try:
+        redraw = True
         while True:
             """
             This is the basic game engine loop
             
-            First the console is cleared,
-            then the engine's event_handler render its current state
+            First the event handler renders its current state, when anything could have changed,
+            and only the parts of the display it drew over are updated.
+            The console is cleared first if the whole screen is being redrawn
             
             Afterwards, the engine then waits for and responds to player input
             before updating the loop
             """
-            screen.surface.fill((0,0,0))
-            handler.on_render(screen)
-            pygame.display.flip()
-
+            if redraw:
+                if screen.needs_full_redraw:
+                    screen.surface.fill((0,0,0))
+                dirty_rects = handler.on_render(screen)
+                if dirty_rects is None or screen.needs_full_redraw:
+                    pygame.display.flip()
+                elif dirty_rects:
+                    pygame.display.update(dirty_rects)
+                # Handlers that don't report what they drew redraw everything every frame
+                screen.needs_full_redraw = dirty_rects is None
+
+            clock.tick(max_fps)
+
+            if wait_for_events:
+                # Block until there is input, or the timeout passes, then take anything else queued
+                events = [pygame.event.wait(event_timeout), *pygame.event.get()]
+                timed_out = events[0].type == pygame.NOEVENT
+                events = [event for event in events if event.type != pygame.NOEVENT]
+                redraw = bool(events) or timed_out
+            else:
+                events = pygame.event.get()
+                redraw = bool(events)
             try:
-                for event in pygame.event.get():
+                for event in events:
+                    previous_handler = handler
                     handler = handler.handle_events(event)
+                    if type(handler) is not type(previous_handler):
+                        screen.needs_full_redraw = True
             except exceptions.QuitWithoutSaving:
                 raise 
             except Exception: # Handle exceptions in game
@@ -141,4 +175,21 @@ def main() -> None:
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="DATA CRAWLERS")
+    parser.add_argument(
+        "--poll", action="store_true", help="poll for input every frame instead of sleeping until there is some"
+    )
+    parser.add_argument(
+        "--event-timeout", type=int, default=0, metavar="MS",
+        help="wake up and redraw after this many milliseconds without input, 0 never does"
+    )
+    parser.add_argument("--max-fps", type=int, default=60, help="frame rate cap")
+    parser.add_argument("--seed", type=int, help="world seed for new games, random by default")
+    args = parser.parse_args()
+
+    main(
+        wait_for_events=not args.poll,
+        event_timeout=args.event_timeout,
+        max_fps=args.max_fps,
+        seed=args.seed
+    )
\ No newline at end of file
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import functools
+import itertools
 import random
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+from typing import Dict, List, NamedTuple, Tuple, TYPE_CHECKING
 
-import tcod
+import numpy as np # type: ignore
 
 import entity_factories
 from game_map import GameMap
@@ -51,32 +53,45 @@ def get_max_value_for_floor(
 
     return current_value
 
-def get_entities_at_random(
-        weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-        number_of_entities: int,
-        floor: int,
-) -> List[Entity]:
-    entity_weighted_chances = {}
-
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
-                entity_weighted_chances[entity] = weighted_chance
-
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
+class SpawnTable:
+    """The entities that can spawn on a floor, with the cumulative weights of their chances"""
+    def __init__(
+        self, weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]], floor: int
+    ):
+        entity_weighted_chances: Dict[Entity, int] = {}
+
+        for key, values in weighted_chances_by_floor.items():
+            if key > floor:
+                break
+            else:
+                for entity, weighted_chance in values:
+                    entity_weighted_chances[entity] = weighted_chance
+
+        self.entities = list(entity_weighted_chances.keys())
+        self.cum_weights = list(itertools.accumulate(entity_weighted_chances.values()))
+
+    def choose(self, number_of_entities: int, rng: random.Random) -> List[Entity]:
+        """Return this many entities picked at random by their chances"""
+        if not number_of_entities:
+            return []
+        return rng.choices(self.entities, cum_weights=self.cum_weights, k=number_of_entities)
+
+class FloorSpawnTables(NamedTuple):
+    max_monsters_per_room: int
+    max_items_per_room: int
+    monsters: SpawnTable
+    items: SpawnTable
+
+@functools.lru_cache(maxsize=None)
+def get_spawn_tables(floor: int) -> FloorSpawnTables:
+    """Return what spawns on this floor, built the first time each floor is asked for"""
+    return FloorSpawnTables(
+        max_monsters_per_room=get_max_value_for_floor(max_monsters_by_floor, floor),
+        max_items_per_room=get_max_value_for_floor(max_items_by_floor, floor),
+        monsters=SpawnTable(enemy_chances, floor),
+        items=SpawnTable(item_chances, floor),
     )
 
-    return chosen_entities
-
 class RectangularRoom:
     def __init__(self, x: int, y: int, width: int, height: int):
         self.x1 = x
@@ -106,50 +121,144 @@ class RectangularRoom:
         )
 
 
+class RoomPlacer:
+    """Accepts rooms that don't overlap any room already placed, using a bitmap of the map
+
+    Each test only looks at the tiles under the candidate, so the cost of an attempt doesn't
+    grow with the number of rooms placed. Rooms are marked including their walls, matching
+    RectangularRoom.intersects
+    """
+    def __init__(self, width: int, height: int):
+        self.occupied = np.zeros((width, height), dtype=bool, order="F")
+
+    def _area(self, room: RectangularRoom) -> Tuple[slice, slice]:
+        return slice(room.x1, room.x2 + 1), slice(room.y1, room.y2 + 1)
+
+    def fits(self, room: RectangularRoom) -> bool:
+        """Return True if this room doesn't overlap a placed room"""
+        return not self.occupied[self._area(room)].any()
+
+    def place(self, room: RectangularRoom) -> None:
+        self.occupied[self._area(room)] = True
+
+    def try_place(self, room: RectangularRoom) -> bool:
+        """Place this room and return True if it fits, otherwise return False"""
+        if not self.fits(room):
+            return False
+        self.place(room)
+        return True
+
+
 def place_entities(
-    room: RectangularRoom, dungeon: GameMap, floor_number: int
+    rooms: List[RectangularRoom], dungeon: GameMap, floor_number: int, rng: random.Random
 ) -> None:
-    number_of_monsters = random.randint(
-        0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
-    )
-    number_of_items = random.randint(
-        0, get_max_value_for_floor(max_items_by_floor, floor_number)
-    )
+    """Spawn monsters and items in every room, picking all of the floor's entities at once
+
+    Each entity gets a floor tile of its own, sampled from the free tiles of its room, so
+    a room only gets fewer entities than were picked when it runs out of tiles. The
+    player's start location is kept free
+    """
+    spawn_tables = get_spawn_tables(floor_number)
+
+    occupied = np.zeros((dungeon.width, dungeon.height), dtype=bool, order="F")
+    occupied[dungeon.start_location] = True
+
+    monster_counts = [rng.randint(0, spawn_tables.max_monsters_per_room) for room in rooms]
+    item_counts = [rng.randint(0, spawn_tables.max_items_per_room) for room in rooms]
+
+    monsters = iter(spawn_tables.monsters.choose(sum(monster_counts), rng))
+    items = iter(spawn_tables.items.choose(sum(item_counts), rng))
+
+    for room, number_of_monsters, number_of_items in zip(rooms, monster_counts, item_counts):
+        entities = [
+            *itertools.islice(monsters, number_of_monsters),
+            *itertools.islice(items, number_of_items),
+        ]
+        if not entities:
+            continue
+
+        inner_x, inner_y = room.inner
+        free_x, free_y = np.nonzero(
+            dungeon.walkable[inner_x, inner_y] & ~occupied[inner_x, inner_y]
+        )
+        chosen = rng.sample(range(len(free_x)), min(len(entities), len(free_x)))
+        xs = (free_x[chosen] + inner_x.start).tolist()
+        ys = (free_y[chosen] + inner_y.start).tolist()
+        occupied[xs, ys] = True
 
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number
-    )
+        for entity, x, y in zip(entities, xs, ys):
+            entity.spawn(dungeon, x, y)
 
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number
-    )
+def straight_line(
+    start: Tuple[int, int], end: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the x and y coordinates of a horizontal or vertical line, both ends included"""
+    def axis(first: int, last: int) -> np.ndarray:
+        step = 1 if last >= first else -1
+        return np.arange(first, last + step, step)
 
-    for entity in monsters + items:
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
-        
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+    (x1, y1), (x2, y2) = start, end
+    return np.broadcast_arrays(axis(x1, x2), axis(y1, y2))
 
 def tunnel_between(
-    start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int, str]]:
-    """Return an L-shaped tunnel between these two points """
+    start: Tuple[int, int], end: Tuple[int, int], rng: random.Random
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the x and y coordinates of an L-shaped tunnel between these two points """
     x1, y1 = start
     x2, y2 = end
-    if random.random() < 0.5: # 50% chance
+    if rng.random() < 0.5: # 50% chance
         # move horizontally, then vertically
         corner_x, corner_y = x2, y1
     else:
         # Move vertically, then horizontally
         corner_x, corner_y = x1, y2
- 
 
     # Generate coordinates for this tunnel
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    first_xs, first_ys = straight_line((x1, y1), (corner_x, corner_y))
+    second_xs, second_ys = straight_line((corner_x, corner_y), (x2, y2))
+    return np.concatenate([first_xs, second_xs]), np.concatenate([first_ys, second_ys])
+
+def autotile_walls(dungeon: GameMap) -> None:
+    """Pick the sprite of every wall from the walkable tiles around it, once carving is done
+
+    A wall is named after the floor beside it: floor to the north makes a "wall_s",
+    floor to the north and west an inside corner "wall_se", and a wall only touching
+    floor diagonally is an outside corner such as "wall_nw_c" for floor to its south east
+    """
+    walkable = dungeon.walkable
+    width, height = walkable.shape
+    padded = np.pad(walkable, 1, constant_values=False)
+
+    def floor_at(dx: int, dy: int) -> np.ndarray:
+        """Return whether the tile at an offset of (dx, dy) from each tile is walkable"""
+        return padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+
+    north, south = floor_at(0, -1), floor_at(0, 1)
+    east, west = floor_at(1, 0), floor_at(-1, 0)
+
+    # Earlier conditions win, so inside corners come before straight walls before outside corners
+    walls: List[Tuple[np.ndarray, str]] = [
+        (north & west, "wall_se"),
+        (north & east, "wall_sw"),
+        (south & west, "wall_nw"),
+        (south & east, "wall_ne"),
+        (north, "wall_s"),
+        (south, "wall_n"),
+        (east, "wall_w"),
+        (west, "wall_e"),
+        (floor_at(1, 1), "wall_nw_c"),
+        (floor_at(-1, 1), "wall_ne_c"),
+        (floor_at(1, -1), "wall_sw_c"),
+        (floor_at(-1, -1), "wall_se_c"),
+    ]
+    wall_ids = np.select(
+        [condition for condition, name in walls],
+        [tile_types.tile_ids[name] for condition, name in walls],
+        default=tile_types.tile_ids["wall_n"],
+    )
+
+    is_wall = ~walkable
+    dungeon.tiles["tile_id"][is_wall] = wall_ids[is_wall]
 
 def generate_dungeon(
     max_rooms: int,
@@ -157,117 +266,67 @@ def generate_dungeon(
     room_max_size: int,
     map_width: int,
     map_height: int,
-    engine: Engine
+    engine: Engine,
+    floor_number: int,
+    rng: random.Random,
 ) -> GameMap:
-    """Generate a new dungeon map """
-    player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+    """Generate a new dungeon map
+
+    Only the new map and its entities are touched, not the player or the engine's
+    current map, so this can run in the background while the current floor is played.
+    The player should be placed at the map's start_location
+    """
+    dungeon = GameMap(engine, map_width, map_height)
 
     rooms: List[RectangularRoom] = []
+    placer = RoomPlacer(map_width, map_height)
 
     center_of_last_room = (0,0)
 
     for r in range(max_rooms):
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
+        room_width = rng.randint(room_min_size, room_max_size)
+        room_height = rng.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width -1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+        x = rng.randint(0, dungeon.width - room_width -1)
+        y = rng.randint(0, dungeon.height - room_height - 1)
 
         # "RectangularRoom" class makes rectangles easier to work with
         new_room = RectangularRoom(x, y, room_width, room_height)
 
-        # Run through the other rooms and see if they intersect with this one
-        if any(new_room.intersects(other_room) for other_room in rooms):
+        # Check the tiles under this room against the rooms already placed
+        if not placer.try_place(new_room):
             continue # This room intersects, so go to the next attempt
         # If there are no intersections then the room is valid
 
         # Dig out this rooms inner area
-        dungeon.tiles[new_room.inner] = tile_types.floor
-
-        wall_west = (slice(x, x), slice(y + 1, y + room_height - 1))
-        if not dungeon.tiles[(x,y)]["walkable"]:
-            dungeon.tiles[(x, y)]["name"] = "wall_nw_c"
-        
-        if not dungeon.tiles[(x+room_width, y)]["walkable"]:
-            dungeon.tiles[(x+room_width, y)]["name"] = "wall_ne_c"
-        
-        if not dungeon.tiles[(x, y+room_height)]["walkable"]:
-            dungeon.tiles[(x, y+room_height)]["name"] = "wall_sw_c"
-        if not dungeon.tiles[(x+room_width, y+room_height)]["walkable"]:
-            dungeon.tiles[(x+room_width, y+room_height)]["name"] = "wall_se_c"
-        for y_offset in range(1, room_height):
-            if not dungeon.tiles[(x, y + y_offset)]["walkable"]:
-                dungeon.tiles[(x, y + y_offset)]["name"] = "wall_w"
-            if not dungeon.tiles[(x+room_width, y + y_offset)]["walkable"]:
-                dungeon.tiles[(x+room_width, y + y_offset)]["name"] = "wall_e"
-
-        for x_offset in range(1, room_width):
-            if not dungeon.tiles[(x+x_offset, y + room_height)]["walkable"]:
-                dungeon.tiles[(x+x_offset, y + room_height)]["name"] = "wall_s"
-
-        place_entities(new_room, dungeon, engine.game_world.current_floor)
+        dungeon.set_tiles(new_room.inner, tile_types.floor)
 
         # Finally, appen the new room to the list
         rooms.append(new_room)
 
-    for idx, room in enumerate(rooms):
-        if idx == 0:
-            player.place(*room.center, dungeon)
-        else:
-            prev_x, prev_y = rooms[idx-1].center
-            for x, y in tunnel_between(rooms[idx-1].center, room.center):
-                dungeon.tiles[x, y] = tile_types.floor
-                
-                if prev_x != x:
-                    # Moving horizontally
-                    if (dungeon.tiles[(x,y+1)] != tile_types.floor):
-                        # check to see if this is a corner
-                        if (dungeon.tiles[x-1, y+1]["walkable"]):
-                            wall_name = "wall_se"
-                        elif (dungeon.tiles[x+1, y+1]["walkable"]):
-                            wall_name = "wall_sw"
-                        else:
-                            wall_name = "wall_s"
-                    
-                        dungeon.tiles[(x,y+1)]["name"] = wall_name
-
-                    if (dungeon.tiles[(x,y-1)]["walkable"] == False):
-                        if (dungeon.tiles[x-1, y-1])["walkable"]:
-                            wall_name = "wall_nw"
-                        elif (dungeon.tiles[x+1, y-1]["walkable"]):
-                            wall_name = "wall_ne"
-                        else:
-                            wall_name = "wall_n"
-
-                        dungeon.tiles[(x,y-1)]["name"] = wall_name
-                    pass
-                elif (prev_y != y):
-                    # Moving vertically
-                    if (dungeon.tiles[(x+1,y)]["walkable"] == False):
-                        if (dungeon.tiles[x+1, y-1]["walkable"]):
-                            wall_name = "wall_se"
-                        elif (dungeon.tiles[x+1, y+1]["walkable"]):
-                            wall_name = "wall_nw"
-                        else:
-                            wall_name = "wall_e"
-
-                        dungeon.tiles[(x+1,y)]["name"] = wall_name
-                    if (dungeon.tiles[(x-1,y)]["walkable"] == False):
-                        if (dungeon.tiles[x-1, y-1]["walkable"]):
-                            wall_name = "wall_sw"
-                        elif (dungeon.tiles[x-1, y+1]["walkable"]):
-                            wall_name = "wall_ne"
-                        else:
-                            wall_name = "wall_w"
-
-                        dungeon.tiles[(x-1,y)]["name"] = wall_name
-                prev_x, prev_y = x,y
-        
-        center_of_last_room = room.center
-
-    dungeon.tiles[center_of_last_room] = tile_types.down_stairs
+    if rooms:
+        dungeon.start_location = rooms[0].center
+
+    place_entities(rooms, dungeon, floor_number, rng)
+
+    # Connect each room to the one before it, carving every tunnel in one write
+    tunnels = [
+        tunnel_between(previous_room.center, room.center, rng)
+        for previous_room, room in zip(rooms, rooms[1:])
+    ]
+    if tunnels:
+        tunnel_xs, tunnel_ys = zip(*tunnels)
+        dungeon.set_tiles(
+            (np.concatenate(tunnel_xs), np.concatenate(tunnel_ys)), tile_types.floor
+        )
+
+    if rooms:
+        center_of_last_room = rooms[-1].center
+
+    dungeon.set_tiles(center_of_last_room, tile_types.down_stairs)
     dungeon.downstairs_location = center_of_last_room
 
+    autotile_walls(dungeon)
+
     return dungeon
 
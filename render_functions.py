@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Tuple, TYPE_CHECKING, Optional
+from typing import List, Tuple, TYPE_CHECKING
 
 import color
 
@@ -16,14 +16,12 @@ if TYPE_CHECKING:
     from game_surface import TileSet
     from entity import Item
 
-mouse_cursor: pygame.Surface = None
-
 def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
     if not game_map.in_bounds(x, y) or not game_map.visible[x, y]:
         return ""
 
     names = ", ".join(
-        entity.name for entity in game_map.entities if entity.x == x and entity.y == y
+        entity.name for entity in game_map.get_entities_at_location(x, y)
     )
 
     return names.capitalize()
@@ -89,7 +87,8 @@ def render_healthbar(
    
 def render_inventory(
     surface: pygame.Surface, location: Tuple[int, int], width: int, inventory: Inventory, tile_set: TileSet,
-) -> Optional[Tuple[List[pygame.Rect,Item]]]:
+) -> Tuple[List[Tuple[pygame.Rect, Item]], pygame.Rect]:
+    """Render the inventory grid, returning the rect of each item's slot and the area drawn over"""
     item_size = 64
 
     grid_size: Tuple[int, int] = (4,8)
@@ -119,20 +118,17 @@ def render_inventory(
             grid_boxes.append((grid_box, (gutter_size * x + location_x + x * item_size + 2,gutter_size* y + location_y + y * item_size + 2)))
             
     
-    surface.blits(grid_boxes)
+    grid_rects = surface.blits(grid_boxes)
    
     inventory_rects =surface.blits(item_boxes)
     inventory_slots = list(zip(inventory_rects, inventory.items))
-    return inventory_slots
+    return inventory_slots, grid_rects[0].unionall(grid_rects[1:])
 
 def render_mouse(
     filename: str
 ) -> pygame.Surface:
-    global mouse_cursor
-    if mouse_cursor is None:
-        img, rect = load_image(name=filename, colorkey=(255,0,255), scale=2)
-        mouse_cursor = img
-    return mouse_cursor
+    img, rect = load_image(name=filename, colorkey=(255,0,255), scale=2)
+    return img
 
 def render_box_at_mouse(
     surface: pygame.Surface,
@@ -1,9 +1,9 @@
 """Handle the loading and initialization of game sessions"""
 from __future__ import annotations
 
-import copy
 import lzma
 import pickle
+import random
 import traceback
 from typing import Optional
 
@@ -31,8 +31,14 @@ from render_functions import load_image, load_tiles
 background_image = tcod.image.load("menu_background.png")[:, :, :3]
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance"""
+def new_game(seed: Optional[int] = None) -> Engine:
+    """Return a brand new game session as an Engine instance
+
+    The same `seed` always makes the same dungeon, a random one is picked if it isn't set
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+
     map_width = 80
     map_height = 43
     
@@ -40,9 +46,9 @@ def new_game() -> Engine:
     room_min_size = 6
     max_rooms = 30
     
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.copy()
     
-    engine = Engine(player=player)
+    engine = Engine(player=player, seed=seed)
 
     engine.game_world = GameWorld(
         engine=engine,
@@ -50,7 +56,8 @@ def new_game() -> Engine:
         room_min_size=room_min_size,
         room_max_size=room_max_size,
         map_width=map_width,
-        map_height=map_height
+        map_height=map_height,
+        seed=seed
     )
     
     engine.game_world.generate_floor()
@@ -60,8 +67,8 @@ def new_game() -> Engine:
         "Hello and welcome, adventurer, to yet another dungeon!", color.welcome_text
     )
 
-    dagger = copy.deepcopy(entity_factories.dagger)
-    leather_armor = copy.deepcopy(entity_factories.leather_armor)
+    dagger = entity_factories.dagger.copy()
+    leather_armor = entity_factories.leather_armor.copy()
 
     dagger.parent = player.inventory
     leather_armor.parent = player.inventory
@@ -79,16 +86,20 @@ def load_game(filename: str) -> Engine:
     with open(filename, "rb") as f:
         engine = pickle.loads(lzma.decompress(f.read()))
     assert isinstance(engine, Engine)
+    engine.game_world.prefetch_next_floor()
     return engine
 
 class MainMenu(event_handlers.base_event_handler.BaseEventHandler):
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
+
     def on_render(self, screen: GameSurface):
         img, rect = load_image("menu_background.png", scale=4)
         screen.surface.blit(img, (0,0))
 
     def ev_keydown(self, event: pygame.event.Event) -> Optional[input_handlers.BaseEventHandler]:
         if event.key == pygame.K_n:
-            return event_handlers.base_event_handler.MainGameHandler(new_game())
+            return event_handlers.base_event_handler.MainGameHandler(new_game(self.seed))
         elif event.key == pygame.K_c:
             try:
                 return event_handlers.base_event_handler.MainGameHandler(load_game("savegame.sav"))
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np # type: ignore
 
@@ -13,13 +13,32 @@ graphic_dt = np.dtype(
     ]
 )
 
+# Every tile sprite name, a tile stores the index of its name here as its "tile_id"
+tile_names: List[str] = [
+    "",
+    "floor",
+    "wall_n",
+    "wall_s",
+    "wall_e",
+    "wall_w",
+    "wall_ne",
+    "wall_nw",
+    "wall_se",
+    "wall_sw",
+    "wall_ne_c",
+    "wall_nw_c",
+    "wall_se_c",
+    "wall_sw_c",
+]
+tile_ids: Dict[str, int] = {name: tile_id for tile_id, name in enumerate(tile_names)}
+
 # Tile struct used for statically defined tile data
 tile_dt = np.dtype(
     [
         ("walkable", bool), # True if this tile can be walked over
         ("transparent", bool), # True if this tile doesn't block FOV
-        ("name", 'U15'),
-        ("sprite", int),
+        ("tile_id", np.uint8), # Index into tile_names
+        ("sprite", np.int8),
 
     ]
 )
@@ -33,7 +52,7 @@ def new_tile(
     
 ) -> np.ndarray:
     """Helper function for defining individual tile types """
-    return np.array((walkable, transparent, name, sprite), dtype=tile_dt)
+    return np.array((walkable, transparent, tile_ids[name], sprite), dtype=tile_dt)
 
 # SHROUD represents unexplored, unseen tiles
 SHROUD = np.array((ord(" "), (255,255,255), (0,0,0)), dtype=graphic_dt)